@@ -1,11 +1,11 @@
 import streamlit as st
+import io
 import os
 import pandas as pd
-import json
 import re
 from dotenv import load_dotenv
 from modules.data_loader import load_data
-from modules.analysis import analyze_trends, summarize_data, summarize_analysis
+from modules.analysis import analyze_trends, build_product_figure, summarize_data, summarize_analysis
 from modules.agents import (
     create_analysis_agent,
     create_hypothesis_agent,
@@ -17,12 +17,55 @@ from modules.tasks import (
     create_validation_task
 )
 from crewai import Crew
-from plotly.io import from_json
-from modules.validation import Hypothesis, ValidationResult
+from modules.validation import HYPOTHESES_ADAPTER, VERDICTS_ADAPTER
+from modules.streaming import CrewStream
+import threading
 import traceback
+from concurrent.futures import ThreadPoolExecutor
 
 load_dotenv()
 
+_FENCE_RE = re.compile(r'```(?:python|json)?\s*|\s*```')
+_SENT_RE = re.compile(r'(?<!\w\.\w.)(?<![A-Z][a-z]\.)(?<=\.|\?)\s')
+
+@st.cache_data(show_spinner=False)
+def _cached_load(file_bytes: bytes) -> pd.DataFrame:
+    # Keyed on the uploaded bytes so reruns skip re-parsing and re-validating the CSV
+    return load_data(io.BytesIO(file_bytes))
+
+@st.cache_data(show_spinner=False)
+def _cached_data_summary(file_bytes: bytes) -> str:
+    return summarize_data(_cached_load(file_bytes))
+
+@st.cache_data(show_spinner=False)
+def _cached_analyze(file_bytes: bytes) -> dict:
+    # Keyed on the uploaded bytes like the loaders; Streamlit only samples large DataFrames when hashing
+    return analyze_trends(_cached_load(file_bytes))
+
+def _agents(api_key, endpoint, deployment_name, fast_deployment_name, api_version, verbose):
+    # crewai Agents rebuild their executor and keep per-run state on it, so they cannot be
+    # shared across sessions; build them once per session and Azure configuration instead.
+    # The pooled HTTP_CLIENT underneath is thread-safe and stays shared process-wide.
+    key = (api_key, endpoint, deployment_name, fast_deployment_name, api_version, verbose)
+    if st.session_state.get("agents_key") != key:
+        # The three agents are independent, so construct them concurrently
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            analysis = executor.submit(create_analysis_agent, api_key, endpoint, deployment_name, api_version, verbose)
+            hypothesis = executor.submit(create_hypothesis_agent, api_key, endpoint, fast_deployment_name, api_version, verbose)
+            validation = executor.submit(create_validation_agent, api_key, endpoint, deployment_name, api_version, verbose)
+        st.session_state.agents = (analysis.result(), hypothesis.result(), validation.result())
+        st.session_state.agents_key = key
+    return st.session_state.agents
+
+def _idle_crew_lock() -> threading.Lock:
+    # Runs outlive an interrupted stream, so one lock per session keeps two crews off its agents;
+    # check it before building the Crew, which already mutates the agent
+    if "crew_lock" not in st.session_state:
+        st.session_state.crew_lock = threading.Lock()
+    if st.session_state.crew_lock.locked():
+        raise RuntimeError("An agent run is still in progress; try again once it finishes")
+    return st.session_state.crew_lock
+
 def parse_hypothesis_output(output):
     try:
         if isinstance(output, str):
@@ -33,18 +76,18 @@ def parse_hypothesis_output(output):
             raise ValueError("Unexpected output format from agent")
         
         # Clean up unwanted formatting (e.g., code blocks)
-        text = re.sub(r'```(?:python)?\s*|\s*```', '', text).strip()
+        text = _FENCE_RE.sub('', text).strip()
         
         # Split into sentences, allowing incomplete outputs
-        sentences = re.split(r'(?<!\w\.\w.)(?<![A-Z][a-z]\.)(?<=\.|\?)\s', text)
-        # Filter out empty or invalid sentences
-        sentences = [s.strip() for s in sentences if s.strip() and len(s.strip()) > 5 and not s.strip().startswith('Agent stopped')]
+        # Filter out empty or invalid sentences, stripping each one only once
+        sentences = [s for s in (s.strip() for s in _SENT_RE.split(text))
+                     if len(s) > 5 and not s.startswith('Agent stopped')]
         
         # Accept one or more hypotheses
         if not sentences:
             raise ValueError(f"No valid hypotheses found. Raw output: {output}")
         
-        hypotheses = [Hypothesis(statement=sentence) for sentence in sentences]
+        hypotheses = HYPOTHESES_ADAPTER.validate_python([{"statement": sentence} for sentence in sentences])
         return hypotheses
     except ValueError as e:
         raise ValueError(f"Error parsing hypotheses: {str(e)}")
@@ -57,21 +100,8 @@ def parse_validation_output(output):
             text = output.raw.strip()
         else:
             raise ValueError("Unexpected output format from agent")
-        blocks = re.split(r'\n\s*\n', text)
-        validations = []
-        for block in blocks:
-            lines = block.strip().split('\n')
-            if len(lines) >= 2:
-                status_line = lines[0].strip()
-                evidence_line = lines[1].strip()
-                if status_line.startswith('- Status:') and evidence_line.startswith('- Evidence:'):
-                    status = status_line.split(':')[1].strip()
-                    evidence = evidence_line.split(':')[1].strip()
-                    validations.append({"status": status, "evidence": evidence})
-                else:
-                    raise ValueError(f"Invalid format in validation block: {block}")
-            else:
-                raise ValueError(f"Insufficient lines in validation block: {block}")
+        # The validation task asks for one JSON array covering every hypothesis
+        validations = VERDICTS_ADAPTER.validate_json(_FENCE_RE.sub('', text).strip())
         # Allow flexible number of validations
         if not validations:
             raise ValueError(f"No valid validations found. Raw output: {output}")
@@ -79,126 +109,161 @@ def parse_validation_output(output):
     except ValueError as e:
         raise ValueError(f"Error parsing validation results: {str(e)}")
 
+@st.fragment
+def analysis_section(file_bytes):
+    # Analyze Data button at the top
+    st.markdown("### Actions")
+    analyze_clicked = st.button("🔍 Analyze Data")
+
+    # Perform analysis action
+    if analyze_clicked:
+        with st.spinner("Analyzing data..."):
+            try:
+                first_analysis = "analysis_results" not in st.session_state
+                analysis_results = _cached_analyze(file_bytes)
+                st.session_state.analysis_results = analysis_results
+                # Summarize once per analysis rather than on every rerun
+                st.session_state.analysis_summary = summarize_analysis(analysis_results)
+                # The hypothesis section is a separate fragment; rerun the app to reveal it
+                if first_analysis:
+                    st.rerun()
+            except Exception as e:
+                st.error(f"🚨 Analysis failed: {str(e)}\n\nStack trace:\n{traceback.format_exc()}")
+
+    # Display analysis results
+    st.markdown("---")
+    if "analysis_results" in st.session_state:
+        st.subheader("Analysis Summary")
+        st.write(st.session_state.analysis_summary)
+
+        st.subheader("Weekly Trends")
+        try:
+            weekly_fig = st.session_state.analysis_results['weekly_trends']
+            st.plotly_chart(weekly_fig, use_container_width=True)
+        except Exception as e:
+            st.error(f"Failed to render Weekly Trends chart: {str(e)}")
+
+        st.subheader("Product Performance")
+        try:
+            product_fig = build_product_figure(st.session_state.analysis_results)
+            st.plotly_chart(product_fig, use_container_width=True)
+        except Exception as e:
+            st.error(f"Failed to render Product Performance chart: {str(e)}")
+
+@st.fragment
+def hypothesis_section(hypothesis_agent, debug):
+    # Generate Hypotheses button after analysis results
+    if "analysis_results" in st.session_state:
+        st.markdown("#### Next Step")
+        hypothesis_clicked = st.button("💡 Generate Hypotheses")
+
+        # Perform hypothesis generation action
+        if hypothesis_clicked:
+            with st.spinner("Generating hypotheses..."):
+                result = None
+                try:
+                    task = create_hypothesis_task(hypothesis_agent, st.session_state.analysis_results)
+                    lock = _idle_crew_lock()
+                    crew = Crew(agents=[hypothesis_agent], tasks=[task], verbose=debug)
+                    stream = CrewStream(crew, lock)
+                    st.write_stream(stream)
+                    result = stream.result
+                    if result:
+                        hypotheses = parse_hypothesis_output(result)
+                        st.session_state.hypotheses = hypotheses
+                        # Hypotheses are shown and validated in another fragment; rerun the app
+                        st.rerun()
+                    else:
+                        st.error("Hypothesis generation returned no result")
+                except ValueError as e:
+                    st.error(f"Error extracting hypotheses: {str(e)}. Raw output: {result}")
+                except Exception as e:
+                    st.error(f"Error processing hypotheses: {str(e)}. Raw output: {result}")
+
+@st.fragment
+def validation_section(validation_agent, debug):
+    # Display hypotheses and Validate Hypotheses button
+    if "hypotheses" in st.session_state:
+        st.markdown("---")
+        st.subheader("Generated Hypotheses")
+        for i, hypothesis in enumerate(st.session_state.hypotheses, 1):
+            st.write(f"**Hypothesis {i}:**")
+            st.write(f"Statement: {hypothesis.statement}")
+
+        # Validate Hypotheses button after hypothesis results
+        st.markdown("#### Next Step")
+        validate_clicked = st.button("✅ Validate Hypotheses")
+
+        # Perform validation action
+        if validate_clicked:
+            with st.spinner("Validating hypotheses..."):
+                result = None
+                try:
+                    task = create_validation_task(validation_agent, [h.statement for h in st.session_state.hypotheses])
+                    lock = _idle_crew_lock()
+                    crew = Crew(agents=[validation_agent], tasks=[task], verbose=debug)
+                    stream = CrewStream(crew, lock)
+                    # Stream into a placeholder so the raw agent output can be cleared once parsed
+                    streamed = st.empty()
+                    streamed.write_stream(stream)
+                    result = stream.result
+                    if result:
+                        if isinstance(result, str):
+                            validation_results = parse_validation_output(result)
+                        elif hasattr(result, 'raw'):
+                            validation_results = parse_validation_output(result.raw)
+                        else:
+                            raise ValueError(f"Unexpected result format: {type(result)}")
+                        st.session_state.validation_results = validation_results
+                        streamed.empty()
+                    else:
+                        st.error("Validation returned no result")
+                except ValueError as e:
+                    st.error(f"Error extracting validation results: {str(e)}. Raw output: {result}")
+                except Exception as e:
+                    st.error(f"Error processing validation: {str(e)}. Raw output: {result}")
+
+    # Display validation results
+    if "validation_results" in st.session_state and "hypotheses" in st.session_state:
+        st.markdown("---")
+        st.subheader("Validation Results")
+        for i, (hypothesis, validation) in enumerate(zip(st.session_state.hypotheses, st.session_state.validation_results), 1):
+            st.write(f"**Validation {i}**")
+            st.write(f"Hypothesis: {hypothesis.statement}")
+            st.write(f"Status: {validation.status}")
+            st.write(f"Evidence: {validation.evidence}")
+
 def main():
     st.title("🏥 Advanced Wound Care Analytics")
+    debug = st.sidebar.checkbox("Debug logs", value=False)
 
     # File uploader
     uploaded_file = st.file_uploader("Upload Wound Data CSV", type=["csv"])
 
     if uploaded_file:
         try:
-            df = load_data(uploaded_file)
+            file_bytes = uploaded_file.getvalue()
+            df = _cached_load(file_bytes)
             st.session_state.data = df
             st.success("✅ Data loaded successfully!")
-            st.write(summarize_data(df))
+            st.write(_cached_data_summary(file_bytes))
 
             # Initialize API and agents once
             api_key = os.getenv("AZURE_OPENAI_API_KEY")
             endpoint = os.getenv("AZURE_ENDPOINT")
             deployment_name = os.getenv("AZURE_DEPLOYMENT_NAME")
+            # Optional smaller/faster deployment for hypothesis enumeration
+            fast_deployment_name = os.getenv("AZURE_FAST_DEPLOYMENT") or deployment_name
             api_version = os.getenv("OPENAI_API_VERSION")
 
-            analysis_agent = create_analysis_agent(api_key, endpoint, deployment_name, api_version)
-            hypothesis_agent = create_hypothesis_agent(api_key, endpoint, deployment_name, api_version)
-            validation_agent = create_validation_agent(api_key, endpoint, deployment_name, api_version)
-
-            # Analyze Data button at the top
-            st.markdown("### Actions")
-            analyze_clicked = st.button("🔍 Analyze Data")
-
-            # Perform analysis action
-            if analyze_clicked:
-                with st.spinner("Analyzing data..."):
-                    try:
-                        analysis_results = analyze_trends(df)
-                        st.session_state.analysis_results = analysis_results
-                    except Exception as e:
-                        st.error(f"🚨 Analysis failed: {str(e)}\n\nStack trace:\n{traceback.format_exc()}")
-
-            # Display analysis results and Generate Hypotheses button
-            st.markdown("---")
-            if "analysis_results" in st.session_state:
-                st.subheader("Analysis Summary")
-                st.write(summarize_analysis(st.session_state.analysis_results))
-
-                st.subheader("Weekly Trends")
-                try:
-                    weekly_fig = from_json(st.session_state.analysis_results['weekly_trends'])
-                    st.plotly_chart(weekly_fig, use_container_width=True)
-                except Exception as e:
-                    st.error(f"Failed to render Weekly Trends chart: {str(e)}")
+            analysis_agent, hypothesis_agent, validation_agent = _agents(
+                api_key, endpoint, deployment_name, fast_deployment_name, api_version, debug
+            )
 
-                st.subheader("Product Performance")
-                try:
-                    product_fig = from_json(st.session_state.analysis_results['product_performance'])
-                    st.plotly_chart(product_fig, use_container_width=True)
-                except Exception as e:
-                    st.error(f"Failed to render Product Performance chart: {str(e)}")
-
-                # Generate Hypotheses button after analysis results
-                st.markdown("#### Next Step")
-                hypothesis_clicked = st.button("💡 Generate Hypotheses")
-
-                # Perform hypothesis generation action
-                if hypothesis_clicked:
-                    with st.spinner("Generating hypotheses..."):
-                        try:
-                            task = create_hypothesis_task(hypothesis_agent, st.session_state.analysis_results)
-                            crew = Crew(agents=[hypothesis_agent], tasks=[task], verbose=True, max_iter=50)
-                            result = crew.kickoff()
-                            if result:
-                                hypotheses = parse_hypothesis_output(result)
-                                st.session_state.hypotheses = hypotheses
-                            else:
-                                st.error("Hypothesis generation returned no result")
-                        except ValueError as e:
-                            st.error(f"Error extracting hypotheses: {str(e)}. Raw output: {result}")
-                        except Exception as e:
-                            st.error(f"Error processing hypotheses: {str(e)}. Raw output: {result}")
-
-            # Display hypotheses and Validate Hypotheses button
-            if "hypotheses" in st.session_state:
-                st.markdown("---")
-                st.subheader("Generated Hypotheses")
-                for i, hypothesis in enumerate(st.session_state.hypotheses, 1):
-                    st.write(f"**Hypothesis {i}:**")
-                    st.write(f"Statement: {hypothesis.statement}")
-
-                # Validate Hypotheses button after hypothesis results
-                st.markdown("#### Next Step")
-                validate_clicked = st.button("✅ Validate Hypotheses")
-
-                # Perform validation action
-                if validate_clicked:
-                    with st.spinner("Validating hypotheses..."):
-                        try:
-                            task = create_validation_task(validation_agent, [h.statement for h in st.session_state.hypotheses])
-                            crew = Crew(agents=[validation_agent], tasks=[task], verbose=True, max_iter=50)
-                            result = crew.kickoff()
-                            if result:
-                                if isinstance(result, str):
-                                    validation_results = parse_validation_output(result)
-                                elif hasattr(result, 'raw'):
-                                    validation_results = parse_validation_output(result.raw)
-                                else:
-                                    raise ValueError(f"Unexpected result format: {type(result)}")
-                                st.session_state.validation_results = validation_results
-                            else:
-                                st.error("Validation returned no result")
-                        except ValueError as e:
-                            st.error(f"Error extracting validation results: {str(e)}. Raw output: {result}")
-                        except Exception as e:
-                            st.error(f"Error processing validation: {str(e)}. Raw output: {result}")
-
-            # Display validation results
-            if "validation_results" in st.session_state and "hypotheses" in st.session_state:
-                st.markdown("---")
-                st.subheader("Validation Results")
-                for i, (hypothesis, validation) in enumerate(zip(st.session_state.hypotheses, st.session_state.validation_results), 1):
-                    st.write(f"**Validation {i}**")
-                    st.write(f"Hypothesis: {hypothesis.statement}")
-                    st.write(f"Status: {validation['status']}")
-                    st.write(f"Evidence: {validation['evidence']}")
+            # Each section is a fragment, so a button press only reruns its own section
+            analysis_section(file_bytes)
+            hypothesis_section(hypothesis_agent, debug)
+            validation_section(validation_agent, debug)
 
         except Exception as e:
             st.error(f"🚨 An error occurred: {str(e)}\n\nStack trace:\n{traceback.format_exc()}")
@@ -1,18 +1,23 @@
 from crewai import Agent
 from langchain_openai import AzureChatOpenAI
+from modules.streaming import TOKEN_HANDLER
+from .http_client import HTTP_CLIENT
 
-def create_analysis_agent(api_key, azure_endpoint, deployment_name, api_version):
+def create_analysis_agent(api_key, azure_endpoint, deployment_name, api_version, verbose=False):
     return Agent(
         role="Clinical Data Analyst",
         goal="Analyze wound healing trends and product performance",
         backstory="Expert in statistical analysis of medical data with 10+ years experience in wound care",
-        verbose=True,
+        verbose=verbose,
         llm=AzureChatOpenAI(
             api_key=api_key,
             azure_endpoint=azure_endpoint,
             api_version=api_version,
             azure_deployment=deployment_name,
+            streaming=True,
+            callbacks=[TOKEN_HANDLER],
+            http_client=HTTP_CLIENT,
             model_kwargs={"response_format": {"type": "json_object"}}
         ),
-        memory=True
+        memory=False
     )
\ No newline at end of file
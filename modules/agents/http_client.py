@@ -0,0 +1,8 @@
+import httpx
+from openai import DefaultHttpxClient
+
+# One connection pool shared by every agent's AzureChatOpenAI, so all agents reuse the
+# same keep-alive connections to the Azure endpoint instead of each opening their own
+HTTP_CLIENT = DefaultHttpxClient(
+    limits=httpx.Limits(max_connections=16, max_keepalive_connections=16),
+)
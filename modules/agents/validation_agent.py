@@ -1,20 +1,25 @@
 from crewai import Agent
 from langchain_openai import AzureChatOpenAI
+from modules.streaming import TOKEN_HANDLER
+from .http_client import HTTP_CLIENT
 
-def create_validation_agent(api_key, azure_endpoint, deployment_name, api_version):
+def create_validation_agent(api_key, azure_endpoint, deployment_name, api_version, verbose=False):
     return Agent(
         role="Clinical Validator",
         goal="Validate medical hypotheses against clinical evidence",
         backstory="Board-certified wound care specialist with expertise in evidence-based medicine",
-        verbose=True,
+        verbose=verbose,
         llm=AzureChatOpenAI(
             api_key=api_key,
             azure_endpoint=azure_endpoint,
             api_version=api_version,
             azure_deployment=deployment_name,
+            streaming=True,
+            callbacks=[TOKEN_HANDLER],
+            http_client=HTTP_CLIENT,
             temperature= 0.1,
         ),
-        max_iter=20,
+        max_iter=1,
         memory=False,
         tools=[]
     )
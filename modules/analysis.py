@@ -2,10 +2,13 @@ import pandas as pd
 import numpy as np
 import plotly.express as px
 from scipy import stats
-import json
+import orjson
 from statsmodels.tsa.seasonal import seasonal_decompose
-from plotly.io import from_json
-import base64  # Added for decoding bdata
+from modules.data_loader import ordered_weeks
+
+def _dumps(obj) -> str:
+    """Pretty-print obj as JSON with orjson, which also handles numpy scalars"""
+    return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY).decode()
 
 def analyze_trends(df: pd.DataFrame) -> dict:
     """Analyze wound care data with simplified data handling and robust error handling"""
@@ -17,134 +20,156 @@ def analyze_trends(df: pd.DataFrame) -> dict:
         analysis['error'] = f"Input DataFrame is empty or missing required columns: {', '.join(required_cols)}"
         return analysis
 
-    # Ensure WEEK is categorical with proper ordering
+    # Ensure WEEK is categorical with proper ordering (load_data already provides it)
     try:
-        df['WEEK'] = pd.Categorical(df['WEEK'],
-                                  categories=sorted(df['WEEK'].unique(), key=lambda x: int(x.split()[-1])),
-                                  ordered=True)
+        if not (isinstance(df['WEEK'].dtype, pd.CategoricalDtype) and df['WEEK'].cat.ordered):
+            df['WEEK'] = pd.Categorical(df['WEEK'], categories=ordered_weeks(df['WEEK']), ordered=True)
     except (ValueError, TypeError) as e:
         analysis['error'] = f"Failed to process WEEK column: {str(e)}"
         return analysis
 
     # 1. Weekly Trends Analysis
     try:
-        weekly = df.groupby('WEEK', observed=True)['TOTAL_WOUND_AREA'].agg(['mean', 'std']).reset_index()
-        weekly.columns = ['WEEK', 'Mean_Wound_Area', 'Std_Wound_Area']
-        weekly['Total_Wounds'] = df.groupby('WEEK', observed=True)['WOUND_COUNT'].sum().reindex(weekly['WEEK']).fillna(0).values
-        weekly['Mean_Wound_Area'] = pd.to_numeric(weekly['Mean_Wound_Area'], errors='coerce').fillna(0)
-        weekly['Std_Wound_Area'] = pd.to_numeric(weekly['Std_Wound_Area'], errors='coerce').fillna(0)
-        weekly['Total_Wounds'] = pd.to_numeric(weekly['Total_Wounds'], errors='coerce').fillna(0)
-
-        analysis['weekly_trends_data'] = weekly.to_dict(orient='records')
+        weekly = df.groupby('WEEK', observed=True).agg(
+            Mean_Wound_Area=('TOTAL_WOUND_AREA', 'mean'),
+            Std_Wound_Area=('TOTAL_WOUND_AREA', 'std'),
+            Total_Wounds=('WOUND_COUNT', 'sum')
+        ).reset_index()
+        # Aggregates are already numeric; only single-row weeks leave a NaN std to fill
+        stat_cols = ['Mean_Wound_Area', 'Std_Wound_Area', 'Total_Wounds']
+        weekly[stat_cols] = weekly[stat_cols].fillna(0)
+
+        # Column-oriented: one list per column instead of one dict per week
+        analysis['weekly_trends_data'] = {col: weekly[col].tolist() for col in weekly.columns}
         fig = px.line(weekly, x='WEEK', y='Mean_Wound_Area', error_y='Std_Wound_Area',
                       title='Weekly Wound Area Trends',
                       labels={'Mean_Wound_Area': 'Mean Wound Area (cm²)', 'WEEK': 'Week'})
-        analysis['weekly_trends'] = fig.to_json()
+        analysis['weekly_trends'] = fig
     except Exception as e:
         analysis['weekly_trends'] = f'{{"error": "Weekly trends analysis failed: {str(e)}"}}'
 
+    # Shared by sections 2 and 5 so NAME is factorized only once
+    by_product = df.groupby('NAME', observed=True)
+
     # 2. Product Performance Analysis
     try:
-        product_stats = df.groupby('NAME', observed=True).agg({
-            'TOTAL_WOUND_AREA': 'mean',
-            'WOUND_COUNT': 'count'
-        }).reset_index()
-        product_stats.columns = ['NAME', 'Mean_Wound_Area', 'Usage_Count']
-        product_stats['Mean_Wound_Area'] = pd.to_numeric(product_stats['Mean_Wound_Area'], errors='coerce').fillna(0)
+        product_stats = by_product.agg(
+            Mean_Wound_Area=('TOTAL_WOUND_AREA', 'mean'),
+            Usage_Count=('WOUND_COUNT', 'count')
+        ).reset_index()
+        product_stats['Mean_Wound_Area'] = product_stats['Mean_Wound_Area'].fillna(0)
         product_stats = product_stats[product_stats['Mean_Wound_Area'] > 0]
-        product_stats = product_stats.sort_values('Mean_Wound_Area', ascending=False).head(10)
+        product_stats = product_stats.nlargest(10, 'Mean_Wound_Area')
 
-        if not product_stats.empty:
-            fig = px.bar(product_stats, x='NAME', y='Mean_Wound_Area',
-                        title='Top 10 Products by Mean Wound Area',
-                        labels={'NAME': 'Product Name', 'Mean_Wound_Area': 'Average Wound Area (cm²)'})
-            analysis['product_performance'] = fig.to_json()
-        else:
-            fig = px.bar(pd.DataFrame({'NAME': ['No Valid Data'], 'Mean_Wound_Area': [0]}),
-                        x='NAME', y='Mean_Wound_Area',
-                        title='Top 10 Products by Mean Wound Area (No Valid Data)')
-            analysis['product_performance'] = fig.to_json()
+        # The figure is only built when rendered (see build_product_figure)
+        analysis['product_performance_data'] = product_stats[['NAME', 'Mean_Wound_Area']].to_dict(orient='records')
     except Exception as e:
-        analysis['product_performance'] = f'{{"error": "Product performance analysis failed: {str(e)}"}}'
+        analysis['product_performance_data'] = f'{{"error": "Product performance analysis failed: {str(e)}"}}'
 
     # 3. Correlation Matrix
     try:
         numeric_cols = ['TOTAL_WOUND_AREA', 'WOUND_COUNT', 'AVG_WOUND_AREA']
-        numeric_df = df[numeric_cols].apply(pd.to_numeric, errors='coerce').fillna(0)
-        analysis['correlation_matrix'] = numeric_df.corr().round(2).to_dict()
+        # Columns are already numeric after schema coercion in load_data
+        values = np.nan_to_num(df[numeric_cols].to_numpy(dtype=np.float64))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            corr = np.corrcoef(values, rowvar=False).round(2)
+        analysis['correlation_matrix'] = pd.DataFrame(corr, index=numeric_cols, columns=numeric_cols).to_dict()
     except Exception as e:
         analysis['correlation_matrix'] = f'{{"error": "Correlation matrix failed: {str(e)}"}}'
 
     # 4. Time Series Decomposition
     try:
         if len(weekly) > 12:
-            weekly_ts = weekly.set_index('WEEK')['Mean_Wound_Area']
-            decomposition = seasonal_decompose(weekly_ts, model='additive', period=4)
+            weeks = weekly['WEEK'].astype(str).tolist()
+            # extrapolate_trend fills the moving-average edges instead of leaving NaNs
+            decomposition = seasonal_decompose(weekly['Mean_Wound_Area'].to_numpy(), model='additive',
+                                               period=4, extrapolate_trend='freq')
             analysis['seasonality'] = {
-                'trend': decomposition.trend.reset_index().rename(columns={'WEEK': 'Week', 'trend': 'Value'}).to_dict(orient='records'),
-                'seasonal': decomposition.seasonal.reset_index().rename(columns={'WEEK': 'Week', 'seasonal': 'Value'}).to_dict(orient='records'),
-                'residual': decomposition.resid.reset_index().rename(columns={'WEEK': 'Week', 'resid': 'Value'}).to_dict(orient='records')
+                name: [{'Week': week, 'Value': value} for week, value in zip(weeks, component.tolist())]
+                for name, component in (('trend', decomposition.trend),
+                                        ('seasonal', decomposition.seasonal),
+                                        ('residual', decomposition.resid))
             }
     except Exception as e:
         analysis['seasonality'] = f'{{"error": "Seasonality analysis failed: {str(e)}"}}'
 
     # 5. Treatment Efficacy Analysis
     try:
-        treatment_efficacy = df.groupby('NAME', observed=True).agg({
-            'TOTAL_WOUND_AREA': 'sum',
-            'WEEK': 'count'
-        }).reset_index()
-        treatment_efficacy.columns = ['NAME', 'Total_Healed_Area', 'Average_Treatment_Duration']
+        treatment_efficacy = by_product.agg(
+            Total_Healed_Area=('TOTAL_WOUND_AREA', 'sum'),
+            Average_Treatment_Duration=('WEEK', 'count')
+        ).reset_index()
         treatment_efficacy['Healing_Rate'] = treatment_efficacy['Total_Healed_Area'] / treatment_efficacy['Average_Treatment_Duration'].replace(0, 1)
         fig = px.scatter(treatment_efficacy, x='Average_Treatment_Duration', y='Healing_Rate',
                          size='Total_Healed_Area', title='Treatment Efficacy Analysis',
                          labels={'Average_Treatment_Duration': 'Average Treatment Duration (Weeks)',
                                  'Healing_Rate': 'Healing Rate (cm²/week)'})
-        analysis['treatment_efficacy'] = fig.to_json()
+        analysis['treatment_efficacy'] = fig
     except Exception as e:
         analysis['treatment_efficacy'] = f'{{"error": "Treatment efficacy analysis failed: {str(e)}"}}'
 
-    # 6. T-test for week-over-week comparison
+    # 6. T-test for week-over-week comparison (Welch's t-test for all week pairs at once)
     try:
-        ttest_results = []
-        weeks = sorted(df['WEEK'].unique())
-        for i in range(len(weeks) - 1):
-            week1 = df[df['WEEK'] == weeks[i]]['TOTAL_WOUND_AREA'].dropna()
-            week2 = df[df['WEEK'] == weeks[i+1]]['TOTAL_WOUND_AREA'].dropna()
-            if (len(week1) > 1 and len(week2) > 1 and
-                not week1.empty and not week2.empty and
-                week1.var() > 1e-10 and week2.var() > 1e-10):
-                t_stat, p_value = stats.ttest_ind(week1, week2, equal_var=False)
-                ttest_results.append({
-                    'week1': str(weeks[i]),
-                    'week2': str(weeks[i+1]),
-                    't_statistic': float(t_stat),
-                    'p_value': float(p_value)
-                })
-            else:
-                ttest_results.append({
-                    'week1': str(weeks[i]),
-                    'week2': str(weeks[i+1]),
-                    't_statistic': None,
-                    'p_value': None,
-                    'note': 'Skipped due to insufficient variance or sample size'
-                })
+        # WEEK is an ordered categorical, so the groups already come out in week order
+        week_stats = df.groupby('WEEK', observed=True, sort=True)['TOTAL_WOUND_AREA'].agg(['mean', 'var', 'count'])
+        weeks = list(week_stats.index)
+        mean, var, count = (week_stats[c].to_numpy(dtype=float) for c in ('mean', 'var', 'count'))
+        se1, se2 = var[:-1] / count[:-1], var[1:] / count[1:]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t_stats = (mean[:-1] - mean[1:]) / np.sqrt(se1 + se2)
+            dof = (se1 + se2) ** 2 / (se1 ** 2 / (count[:-1] - 1) + se2 ** 2 / (count[1:] - 1))
+            p_values = 2 * stats.t.sf(np.abs(t_stats), dof)
+        testable = (count[:-1] > 1) & (count[1:] > 1) & (var[:-1] > 1e-10) & (var[1:] > 1e-10)
+        ttest_results = [
+            {
+                'week1': str(week1),
+                'week2': str(week2),
+                't_statistic': float(t_stat),
+                'p_value': float(p_value)
+            } if ok else {
+                'week1': str(week1),
+                'week2': str(week2),
+                't_statistic': None,
+                'p_value': None,
+                'note': 'Skipped due to insufficient variance or sample size'
+            }
+            for week1, week2, t_stat, p_value, ok in zip(weeks[:-1], weeks[1:], t_stats, p_values, testable)
+        ]
         analysis['ttest_results'] = {'week_over_week': ttest_results}
     except Exception as e:
         analysis['ttest_results'] = f'{{"error": "T-test analysis failed: {str(e)}"}}'
 
     return analysis
 
+def build_product_figure(analysis: dict):
+    """Build the top products bar chart from the product performance data"""
+    product_data = analysis.get('product_performance_data')
+    if isinstance(product_data, str):
+        raise ValueError(product_data)
+    if product_data:
+        return px.bar(pd.DataFrame(product_data), x='NAME', y='Mean_Wound_Area',
+                      title='Top 10 Products by Mean Wound Area',
+                      labels={'NAME': 'Product Name', 'Mean_Wound_Area': 'Average Wound Area (cm²)'})
+    return px.bar(pd.DataFrame({'NAME': ['No Valid Data'], 'Mean_Wound_Area': [0]}),
+                  x='NAME', y='Mean_Wound_Area',
+                  title='Top 10 Products by Mean Wound Area (No Valid Data)')
+
 def summarize_data(df: pd.DataFrame) -> str:
     """Enhanced summary statistics"""
+    # Reduce the raw ndarrays directly; nan-aware with ddof=1 to match the pandas reductions
+    if 'AVG_WOUND_AREA' in df.columns:
+        avg_area = df['AVG_WOUND_AREA'].to_numpy(dtype=np.float64)
+        avg_size = f"{np.nanmean(avg_area):.2f} ± {np.nanstd(avg_area, ddof=1):.2f}"
+    else:
+        avg_size = "N/A"
     stats = {
         "Total Records": len(df),
-        "Unique Products": df['NAME'].nunique() if 'NAME' in df.columns else 0,
+        "Unique Products": len(pd.unique(df['NAME'].dropna().to_numpy())) if 'NAME' in df.columns else 0,
         "Treatment Weeks": df['WEEK'].nunique(),
-        "Total Wound Area (cm²)": f"{df['TOTAL_WOUND_AREA'].sum():,.2f}",
-        "Average Wound Size (cm²)": f"{df['AVG_WOUND_AREA'].mean():.2f} ± {df['AVG_WOUND_AREA'].std():.2f}" if 'AVG_WOUND_AREA' in df.columns else "N/A"
+        "Total Wound Area (cm²)": f"{np.nansum(df['TOTAL_WOUND_AREA'].to_numpy(dtype=np.float64)):,.2f}",
+        "Average Wound Size (cm²)": avg_size
     }
-    return json.dumps(stats, indent=2)
+    return _dumps(stats)
 
 def summarize_analysis(analysis: dict) -> str:
     """Generate a dynamic summary based on actual analysis results"""
@@ -152,60 +177,43 @@ def summarize_analysis(analysis: dict) -> str:
 
     if 'error' in analysis:
         summary['Error'] = analysis['error']
-        return json.dumps(summary, indent=2)
+        return _dumps(summary)
 
     # 1. Weekly Trends
     if 'weekly_trends_data' in analysis and 'error' not in analysis.get('weekly_trends_data', ''):
-        weekly_data = pd.DataFrame(analysis['weekly_trends_data'])
-        if not weekly_data.empty:
-            max_week = weekly_data.loc[weekly_data['Mean_Wound_Area'].idxmax()]['WEEK']
-            min_week = weekly_data.loc[weekly_data['Mean_Wound_Area'].idxmin()]['WEEK']
+        weekly_data = analysis['weekly_trends_data']
+        means = weekly_data['Mean_Wound_Area']
+        if means:
+            max_week = weekly_data['WEEK'][max(range(len(means)), key=means.__getitem__)]
+            min_week = weekly_data['WEEK'][min(range(len(means)), key=means.__getitem__)]
             summary["Weekly Trends"] = f"Mean wound area peaked in {max_week} and was lowest in {min_week}"
         else:
             summary["Weekly Trends"] = "No valid weekly trend data available"
 
     # 2. Top Products
-    if 'product_performance' in analysis:
-        try:
-            product_fig = from_json(analysis['product_performance'])
-            if hasattr(product_fig, 'data') and product_fig.data and len(product_fig.data) > 0:
-                trace = product_fig.data[0]
-                if hasattr(trace, 'x') and trace.x and hasattr(trace, 'y') and trace.y:
-                    # Handle case where y is a dict with dtype and bdata
-                    if isinstance(trace.y, dict) and 'bdata' in trace.y and 'dtype' in trace.y:
-                        y_array = np.frombuffer(base64.b64decode(trace.y['bdata']), dtype=trace.y['dtype'])
-                        x_data = list(trace.x)
-                        y_data = list(y_array)
-                    else:
-                        x_data = list(trace.x)
-                        y_data = list(trace.y)
-                    
-                    if x_data and y_data and len(x_data) > 0 and len(y_data) > 0:
-                        top_product = x_data[0]
-                        top_product_area = float(y_data[0])
-                        summary["Top Products"] = f"{top_product} treated the largest average wound area ({top_product_area:.2f} cm²)"
-                    else:
-                        summary["Top Products"] = "Product data arrays are empty"
-                else:
-                    summary["Top Products"] = "No valid x or y data in product trace"
-            else:
-                summary["Top Products"] = "No product data available in figure"
-        except Exception as e:
-            summary["Top Products"] = f"Error processing product data: {str(e)}"
+    if 'product_performance_data' in analysis:
+        product_data = analysis['product_performance_data']
+        if isinstance(product_data, str):
+            summary["Top Products"] = f"Error processing product data: {product_data}"
+        elif product_data:
+            top = product_data[0]
+            summary["Top Products"] = f"{top['NAME']} treated the largest average wound area ({float(top['Mean_Wound_Area']):.2f} cm²)"
+        else:
+            summary["Top Products"] = "No product data available"
     else:
         summary["Top Products"] = "Product performance data not found"
 
     # 3. Key Correlations
     if 'correlation_matrix' in analysis and 'error' not in analysis['correlation_matrix']:
         corr_matrix = analysis['correlation_matrix']
-        max_corr = 0
-        corr_pair = ""
-        for col1 in corr_matrix:
-            for col2 in corr_matrix[col1]:
-                if col1 != col2 and abs(corr_matrix[col1][col2]) > abs(max_corr) and abs(corr_matrix[col1][col2]) < 1:
-                    max_corr = corr_matrix[col1][col2]
-                    corr_pair = f"{col1} vs {col2}"
-        summary["Key Correlations"] = f"Strongest correlation ({max_corr:.2f}) between {corr_pair}" if max_corr != 0 else "No significant correlations found"
+        cols = list(corr_matrix)
+        corr = np.array([[corr_matrix[col1][col2] for col2 in cols] for col1 in cols], dtype=float)
+        # Ignore the diagonal, perfect correlations and NaNs; argmax keeps the first pair on ties
+        strength = np.abs(corr)
+        strength = np.where(~np.eye(len(cols), dtype=bool) & (strength < 1), strength, -1)
+        i, j = np.unravel_index(strength.argmax(), strength.shape)
+        summary["Key Correlations"] = (f"Strongest correlation ({corr[i, j]:.2f}) between {cols[i]} vs {cols[j]}"
+                                       if strength[i, j] > 0 else "No significant correlations found")
 
     # 4. Seasonal Patterns
     if 'seasonality' in analysis and 'error' not in analysis['seasonality']:
@@ -221,4 +229,4 @@ def summarize_analysis(analysis: dict) -> str:
         summary["Week over week t-test"] = (f"Found {significant_changes} significant week-over-week changes (p<0.05)" +
                                             (f", {skipped_tests} tests skipped due to low variance" if skipped_tests > 0 else ""))
 
-    return json.dumps(summary, indent=2)
\ No newline at end of file
+    return _dumps(summary)
\ No newline at end of file
@@ -0,0 +1,60 @@
+import queue
+import threading
+from langchain_core.callbacks import BaseCallbackHandler
+
+# TOKEN_HANDLER is one handler shared by every agent's LLM, so each crew run gets its own
+# token queue, looked up from the thread it runs in, and concurrent runs never mix tokens
+_local = threading.local()
+
+class TokenQueueHandler(BaseCallbackHandler):
+    """Forward streamed LLM tokens to the queue of the crew run in the current thread"""
+
+    def on_llm_new_token(self, token: str, **kwargs) -> None:
+        tokens = getattr(_local, "tokens", None)
+        if tokens is not None and token:
+            tokens.put(token)
+
+TOKEN_HANDLER = TokenQueueHandler()
+
+class CrewStream:
+    """Run crew.kickoff() in a worker thread, yielding LLM tokens as they arrive.
+
+    Iterate it (e.g. with st.write_stream) to drive the run; the final crew output is
+    available as `result` once iteration finishes, and any kickoff error is re-raised.
+
+    The worker outlives an interrupted iteration (e.g. a Streamlit rerun), so `lock` is held
+    from start until kickoff returns; pass the same lock for every crew sharing an agent and a
+    second run raises RuntimeError instead of sharing the agent's executor with the first.
+    """
+
+    def __init__(self, crew, lock: threading.Lock):
+        self.crew = crew
+        self.lock = lock
+        self.result = None
+        self._error = None
+
+    def _run(self, tokens: queue.Queue) -> None:
+        _local.tokens = tokens
+        try:
+            self.result = self.crew.kickoff()
+        except Exception as e:
+            self._error = e
+        finally:
+            self.lock.release()
+            tokens.put(None)
+
+    def __iter__(self):
+        if not self.lock.acquire(blocking=False):
+            raise RuntimeError("An agent run is still in progress; try again once it finishes")
+        tokens = queue.Queue()
+        worker = threading.Thread(target=self._run, args=(tokens,), daemon=True)
+        try:
+            worker.start()
+        except BaseException:
+            self.lock.release()
+            raise
+        while (token := tokens.get()) is not None:
+            yield token
+        worker.join()
+        if self._error is not None:
+            raise self._error
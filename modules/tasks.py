@@ -2,14 +2,9 @@ from crewai import Task
 from typing import Dict, Any, List
 import pandas as pd
 from modules.analysis import summarize_data, summarize_analysis
-import json
 from crewai import Agent
 
-def create_analysis_task(agent: Agent, data: pd.DataFrame) -> Task:
-    """Create a task for analyzing wound care data."""
-    summary = summarize_data(data)
-    return Task(
-        description=f"""Analyze the following wound care dataset and provide the results in json format:
+_ANALYSIS_DESC = """Analyze the following wound care dataset and provide the results in json format:
 
 {summary}
 
@@ -21,7 +16,13 @@ Include the following in the json output:
 5. Treatment efficacy analysis (healing rate vs treatment duration).
 6. T-test results for week-over-week wound area comparisons.
 
-Note: Ensure the response is a valid json object, and keep it as concise as possible to avoid length limits. Do not use Chain of thought. Do not add any extra text or explanations. Be as brief as humanly possible. Make sure to return a valid JSON object. This is not the last task, there are more steps after this.""",
+Note: Ensure the response is a valid json object, and keep it as concise as possible to avoid length limits. Do not use Chain of thought. Do not add any extra text or explanations. Be as brief as humanly possible. Make sure to return a valid JSON object. This is not the last task, there are more steps after this."""
+
+def create_analysis_task(agent: Agent, data: pd.DataFrame) -> Task:
+    """Create a task for analyzing wound care data."""
+    summary = summarize_data(data)
+    return Task(
+        description=_ANALYSIS_DESC.format(summary=summary),
         agent=agent,
         expected_output="A json object with weekly trends, product performance, correlation matrix, time series decomposition, treatment efficacy, and t-test results.",
         output_json=True,
@@ -52,35 +53,35 @@ Do not use chain of thought. Provide directly the result. This is not the last t
     )
 
 def create_validation_task(agent: Agent, hypotheses: List[str]) -> Task:
-    """Create a task for validating hypotheses."""
-    hypotheses_str = "\n".join([f"- {h}" for h in hypotheses])
+    """Create a task for validating all hypotheses in a single completion."""
+    hypotheses_str = "\n".join([f"{i}. {h}" for i, h in enumerate(hypotheses, 1)])
 
     return Task(
-        description=f"""Validate the following hypotheses:
+        description=f"""You will receive a numbered list of hypotheses. Validate all of them in a single answer:
 
 {hypotheses_str}
 
-For each hypothesis, provide a concise validation in the following format:
-- Status: supported/unsupported/inconclusive
-- Evidence: [a single, very short sentence]
+Your final answer must be a JSON array with one object per hypothesis, in the same order as the list, each with two keys:
+- "status": supported/unsupported/inconclusive
+- "evidence": a single, very short sentence
 
-Separate the validations for each hypothesis with a blank line.
+Do not call tools. Reply in exactly this format, with the array right after "Final Answer:":
 
-Do not include any extra text or explanations. Be as brief as possible.
-Do not use chain of thought. Provide directly the result.
-Make sure to provide the status and the evidence in lowercase.
+Thought: I now know the final answer
+Final Answer: <the JSON array>
 
-Example:
-- Status: supported
-- Evidence: data shows consistent trends
+Do not include any extra text or explanations after the array. Be as brief as possible.
+Make sure to provide the status and the evidence in lowercase.
 
-- Status: inconclusive
-- Evidence: insufficient data for confirmation
+Example final answer:
+[
+  {{"status": "supported", "evidence": "data shows consistent trends"}},
+  {{"status": "inconclusive", "evidence": "insufficient data for confirmation"}}
+]
 
 This is the last task; make sure to give the final output.""",
         agent=agent,
-        expected_output="Validation results for each hypothesis in plain text, with status and evidence.",
+        expected_output="A JSON array with the status and evidence for each hypothesis, in order.",
         output_json=False,
-        max_iter=20,
         max_rpm=15000,
-    )
\ No newline at end of file
+    )
@@ -1,27 +1,37 @@
-from pydantic import BaseModel, Field, ConfigDict
-from typing import List, Dict, Optional
+from dataclasses import dataclass
+from pydantic import BaseModel, Field, ConfigDict, TypeAdapter
+from typing import List, Dict, Iterator, Optional
 import pandas as pd
 
 class Hypothesis(BaseModel):
     model_config = ConfigDict(arbitrary_types_allowed=True)
     statement: str
 
-class ValidationResult(BaseModel):
-    model_config = ConfigDict(arbitrary_types_allowed=True)
+# Plain slotted dataclass: results are built internally, so pydantic validation per instance is not needed
+@dataclass(slots=True)
+class ValidationResult:
     hypothesis: Hypothesis
     status: str
     evidence: str
 
-def validate_hypotheses(hypotheses: List[Hypothesis], data: pd.DataFrame, analysis_results: Dict) -> List[ValidationResult]:
-    results = []
+class ValidationVerdict(BaseModel):
+    """Status and evidence returned by the validation agent for one hypothesis"""
+    model_config = ConfigDict(str_strip_whitespace=True)
+    status: str
+    evidence: str
+
+HYPOTHESES_ADAPTER = TypeAdapter(List[Hypothesis])
+
+VERDICTS_ADAPTER = TypeAdapter(List[ValidationVerdict])
+
+DEFAULT_STATUS = "inconclusive"
+DEFAULT_EVIDENCE = "Requires further analysis."
+
+def validate_hypotheses(hypotheses: List[Hypothesis], data: pd.DataFrame, analysis_results: Dict) -> Iterator[ValidationResult]:
+    """Lazily yield one ValidationResult per hypothesis; wrap in list() if all are needed at once"""
+    # Inlined validate_single_hypothesis to skip a call per hypothesis
     for hypothesis in hypotheses:
-        validation_result = validate_single_hypothesis(hypothesis, data, analysis_results)
-        results.append(validation_result.model_dump())
-    return results
+        yield ValidationResult(hypothesis=hypothesis, status=DEFAULT_STATUS, evidence=DEFAULT_EVIDENCE)
 
 def validate_single_hypothesis(hypothesis: Hypothesis, data: pd.DataFrame, analysis_results: Dict) -> ValidationResult:
-    return ValidationResult(
-        hypothesis=hypothesis,
-        status="inconclusive",
-        evidence="Requires further analysis.",
-    )
+    return ValidationResult(hypothesis=hypothesis, status=DEFAULT_STATUS, evidence=DEFAULT_EVIDENCE)